@@ -4,13 +4,16 @@ import pandas as pd
 import numpy as np
 import streamlit as st
 import plotly.express as px
+import plotly.graph_objects as go
 from datetime import timedelta
+from build_db import TABLES, build_db
 
 # ---------- Paths & Constants ----------
 BASE = Path(__file__).parent
 DB_PATH = BASE / "hospital.db"
 DATA_DIR = BASE / "data"
 SCHEMA_PATH = BASE / "schema.sql"
+POST_LOAD_PATH = BASE / "post_load.sql"
 
 st.set_page_config(page_title="Hospital Ops Dashboard", layout="wide")
 
@@ -22,139 +25,169 @@ def ensure_db_exists():
     if not SCHEMA_PATH.exists():
         st.error("schema.sql not found. Please keep schema.sql next to this file.")
         st.stop()
+    if not POST_LOAD_PATH.exists():
+        st.error("post_load.sql not found. Please keep post_load.sql next to this file.")
+        st.stop()
     if not DATA_DIR.exists():
         st.error("data/ folder not found. Please include CSVs in data/.")
         st.stop()
 
-    con = sqlite3.connect(DB_PATH.as_posix())
-    try:
-        with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
-            con.executescript(f.read())
+    for name in TABLES:
+        csv_path = DATA_DIR / f"{name}.csv"
+        if not csv_path.exists():
+            st.error(f"Missing {csv_path}.")
+            st.stop()
 
-        for name in ["patients", "units", "bed_capacity", "staff", "admissions"]:
-            csv_path = DATA_DIR / f"{name}.csv"
-            if not csv_path.exists():
-                st.error(f"Missing {csv_path}.")
-                st.stop()
-            df = pd.read_csv(csv_path)
-            df.to_sql(name, con, if_exists="append", index=False)
-    finally:
-        con.commit()
-        con.close()
+    build_db(DB_PATH, SCHEMA_PATH, POST_LOAD_PATH, DATA_DIR)
 
 
 ensure_db_exists()
 
+# The DB file's mtime is passed to get_con and every cached loader so it is
+# part of their cache keys: a rebuilt hospital.db (here or via make_sqlite.py
+# while the app is running) gets a fresh connection and fresh results.
+db_mtime = DB_PATH.stat().st_mtime
+
 
 # ---------- DB helpers ----------
-def get_con():
-    return sqlite3.connect(DB_PATH.as_posix(), check_same_thread=False)
-
-
-@st.cache_data(show_spinner=False)
-def get_date_bounds():
-    con = get_con()
-    try:
-        row = pd.read_sql(
-            "SELECT MIN(date(admit_ts)) AS dmin, MAX(date(admit_ts)) AS dmax FROM admissions",
-            con,
-        ).iloc[0]
-        dmin = pd.to_datetime(row["dmin"]).date()
-        dmax = pd.to_datetime(row["dmax"]).date()
-        return dmin, dmax
-    finally:
-        con.close()
-
-
-@st.cache_data(show_spinner=False)
-def get_distinct_values():
-    con = get_con()
-    try:
-        hospitals = pd.read_sql(
-            "SELECT DISTINCT hospital FROM admissions ORDER BY hospital", con
-        )["hospital"].tolist()
-        units = pd.read_sql(
-            "SELECT DISTINCT unit_id FROM admissions ORDER BY unit_id", con
-        )["unit_id"].tolist()
-        return hospitals, units
-    finally:
-        con.close()
-
-
-@st.cache_data(show_spinner=False)
-def load_refs():
-    con = get_con()
-    try:
-        units = pd.read_sql("SELECT * FROM units", con)
-        beds = pd.read_sql("SELECT * FROM bed_capacity", con)
-        staff = pd.read_sql("SELECT * FROM staff", con)
-        return units, beds, staff
-    finally:
-        con.close()
-
-
-@st.cache_data(show_spinner=False)
-def load_admissions(date_from=None, date_to=None, hospital=None, unit=None):
-    con = get_con()
-    try:
-        q = "SELECT * FROM admissions WHERE 1=1"
-        params = []
-
-        if date_from is not None:
-            q += " AND date(admit_ts) >= date(?)"
-            params.append(str(date_from))
-        if date_to is not None:
-            q += " AND date(admit_ts) <= date(?)"
-            params.append(str(date_to))
-        if hospital is not None and hospital != "All":
-            q += " AND hospital = ?"
-            params.append(hospital)
-        if unit is not None and unit != "All":
-            q += " AND unit_id = ?"
-            params.append(unit)
-
-        adm = pd.read_sql(q, con, params=params)
-        adm["admit_ts"] = pd.to_datetime(adm["admit_ts"], errors="coerce")
-        adm["discharge_ts"] = pd.to_datetime(adm["discharge_ts"], errors="coerce")
-        return adm
-    finally:
-        con.close()
+@st.cache_resource(max_entries=1, show_spinner=False)
+def get_con(db_mtime):
+    """
+    One long-lived connection shared across reruns so SQLite's page cache
+    stays warm. Callers must not close it or change its settings.
+    db_mtime only keys the cache; a new value replaces the old connection.
+    """
+    con = sqlite3.connect(DB_PATH.as_posix(), check_same_thread=False, isolation_level=None)
+    # Read-heavy tuning: larger page cache (~64 MB), in-memory temp tables
+    # and memory-mapped I/O. The dashboard never writes, so lock the
+    # connection to read-only last.
+    con.executescript(
+        """
+        PRAGMA cache_size=-64000;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA mmap_size=268435456;
+        PRAGMA query_only=1;
+        """
+    )
+    return con
+
+
+@st.cache_data(ttl="1h", show_spinner=False)
+def get_date_bounds(db_mtime):
+    con = get_con(db_mtime)
+    row = pd.read_sql(
+        "SELECT date(MIN(admit_epoch), 'unixepoch') AS dmin,"
+        " date(MAX(admit_epoch), 'unixepoch') AS dmax FROM admissions",
+        con,
+    ).iloc[0]
+    dmin = pd.to_datetime(row["dmin"]).date()
+    dmax = pd.to_datetime(row["dmax"]).date()
+    return dmin, dmax
+
+
+@st.cache_data(ttl="1h", show_spinner=False)
+def get_distinct_values(db_mtime):
+    con = get_con(db_mtime)
+    # One round-trip against the small bed_capacity reference table instead
+    # of two DISTINCT scans over admissions.
+    pairs = pd.read_sql("SELECT DISTINCT hospital, unit_id FROM bed_capacity", con)
+    hospitals = sorted(pairs["hospital"].unique().tolist())
+    units = sorted(pairs["unit_id"].unique().tolist())
+    return hospitals, units
+
+
+@st.cache_data(ttl="1h", show_spinner=False)
+def load_refs(db_mtime):
+    con = get_con(db_mtime)
+    units = pd.read_sql("SELECT * FROM units", con)
+    beds = pd.read_sql("SELECT * FROM bed_capacity", con)
+    staff = pd.read_sql("SELECT * FROM staff", con)
+    return units, beds, staff
+
+
+def day_start_epoch(d):
+    """Unix seconds at midnight of date d (timestamps are stored as naive UTC)."""
+    return int(pd.Timestamp(d).timestamp())
+
+
+def admissions_filter_sql(date_from=None, date_to=None, hospital=None, unit=None):
+    """Build the WHERE clause and params shared by the filter-aware admissions queries."""
+    where = "WHERE 1=1"
+    params = []
+
+    # Integer range on the indexed epoch column; no per-row date parsing
+    if date_from is not None:
+        where += " AND admit_epoch >= ?"
+        params.append(day_start_epoch(date_from))
+    if date_to is not None:
+        where += " AND admit_epoch < ?"
+        params.append(day_start_epoch(date_to + timedelta(days=1)))
+    if hospital is not None and hospital != "All":
+        where += " AND hospital = ?"
+        params.append(hospital)
+    if unit is not None and unit != "All":
+        where += " AND unit_id = ?"
+        params.append(unit)
+    return where, params
+
+
+@st.cache_data(ttl="10m", max_entries=64, show_spinner=False)
+def load_admissions(db_mtime, date_from=None, date_to=None, hospital=None, unit=None):
+    con = get_con(db_mtime)
+    where, params = admissions_filter_sql(date_from, date_to, hospital, unit)
+    q = (
+        "SELECT encounter_id, patient_id, hospital, unit_id, triage_level,"
+        " admit_epoch AS admit_ts, wait_minutes, discharge_epoch AS discharge_ts,"
+        " (discharge_epoch - admit_epoch) / 3600.0 AS los_hours"
+        f" FROM admissions {where} ORDER BY rowid"
+    )
+
+    # Timestamps arrive as unix seconds (integer -> datetime64, no string
+    # parsing); numeric columns are narrowed while fetching
+    adm = pd.read_sql(
+        q, con, params=params,
+        parse_dates={"admit_ts": {"unit": "s"}, "discharge_ts": {"unit": "s"}},
+        dtype={"wait_minutes": "float32"},
+    )
+    # Low-cardinality keys as categoricals: groupbys hash small integer codes
+    for c in ("hospital", "unit_id", "triage_level"):
+        adm[c] = adm[c].astype("category")
+    return adm
+
+
+@st.cache_data(ttl="10m", max_entries=64, show_spinner=False)
+def load_daily_census(db_mtime, date_from, date_to, hospital=None, unit=None):
+    """
+    Daily concurrent census per (hospital, unit) over [date_from, date_to],
+    read from the daily_census table precomputed when the DB is built.
+    Units with nobody in house on a day have census 0 (not a missing row).
+    Returns dataframe with columns: hospital, unit_id, date, census.
+    """
+    con = get_con(db_mtime)
+    q = "SELECT hospital, unit_id, date, census FROM daily_census WHERE date BETWEEN ? AND ?"
+    params = [str(date_from), str(date_to)]
+
+    if hospital is not None and hospital != "All":
+        q += " AND hospital = ?"
+        params.append(hospital)
+    if unit is not None and unit != "All":
+        q += " AND unit_id = ?"
+        params.append(unit)
+
+    census = pd.read_sql(q, con, params=params)
+    census["date"] = pd.to_datetime(census["date"]).dt.date
+    return census
 
 
 # ---------- daily census occupancy ----------
-def compute_daily_true_occupancy(adm: pd.DataFrame, beds_ref: pd.DataFrame,
-                                 date_start, date_end) -> pd.DataFrame:
+def compute_daily_true_occupancy(census: pd.DataFrame, beds_ref: pd.DataFrame) -> pd.DataFrame:
     """
-    Compute TRUE daily occupancy% using concurrent census:
-    A patient counts on day D if admit_ts.date() <= D and discharge_ts.date() > D.
+    Compute TRUE daily occupancy% from the concurrent census (see load_daily_census).
     Returns dataframe with columns: hospital, unit_id, date, census, staffed_beds, occ_pct.
     """
-    if adm.empty:
+    if census.empty:
         return pd.DataFrame(columns=["hospital","unit_id","date","census","staffed_beds","occ_pct"])
 
-    # Work on dates (drop times for daily census)
-    df = adm.copy()
-    df["admit_d"] = df["admit_ts"].dt.date
-    df["discharge_d"] = df["discharge_ts"].dt.date
-
-    # Build list of dates in selected window
-    days = pd.date_range(pd.to_datetime(date_start), pd.to_datetime(date_end), freq="D").date
-
-    # For efficiency with moderate data: compute per (hospital, unit) then per day
-    groups = []
-    for (h, u), g in df.groupby(["hospital", "unit_id"]):
-        # Sort not required but can help readability
-        g = g[["admit_d","discharge_d"]]
-        # For each day, count intervals where admit_d <= day < discharge_d
-        # (discharge day not counted—patient leaves at some time that day)
-        census_list = []
-        for d in days:
-            c = ((g["admit_d"] <= d) & (g["discharge_d"] > d)).sum()
-            census_list.append({"hospital": h, "unit_id": u, "date": d, "census": int(c)})
-        groups.append(pd.DataFrame(census_list))
-
-    census = pd.concat(groups, ignore_index=True) if groups else pd.DataFrame()
-
     # Attach staffed beds, compute occ pct
     out = census.merge(beds_ref, on=["hospital","unit_id"], how="left")
     out.rename(columns={"baseline_staffed_beds": "staffed_beds"}, inplace=True)
@@ -167,9 +200,9 @@ def compute_daily_true_occupancy(adm: pd.DataFrame, beds_ref: pd.DataFrame,
 # ---------- UI: Filters ----------
 st.title("Hospital Resource Utilization Dashboard")
 
-units_ref, beds_ref, staff_ref = load_refs()
-date_min, date_max = get_date_bounds()
-all_hospitals, all_units = get_distinct_values()
+units_ref, beds_ref, staff_ref = load_refs(db_mtime)
+date_min, date_max = get_date_bounds(db_mtime)
+all_hospitals, all_units = get_distinct_values(db_mtime)
 
 c1, c2, c3 = st.columns(3)
 with c1:
@@ -181,7 +214,7 @@ with c3:
 
 # ---------- Data pull (filter-aware) ----------
 if len(date_range) == 2:
-    adm = load_admissions(date_from=date_range[0], date_to=date_range[1], hospital=hospital, unit=unit)
+    adm = load_admissions(db_mtime, date_from=date_range[0], date_to=date_range[1], hospital=hospital, unit=unit)
     st.caption(f"Filtered encounters: {len(adm):,}")
 else:
     st.error("Please select the end date.")
@@ -192,15 +225,19 @@ if len(adm) == 0:
     st.stop()
 
 # ---------- KPIs ----------
-adm = adm.copy()
-adm["los_hours"] = (adm["discharge_ts"] - adm["admit_ts"]).dt.total_seconds() / 3600.0
-avg_los = float(adm["los_hours"].mean()) if len(adm) else 0.0
-admissions_per_day = adm.groupby(adm["admit_ts"].dt.date).size().mean() if len(adm) else 0.0
+# Admit day as datetime64[D], computed once and shared by every per-day groupby
+admit_day = pd.Series(adm["admit_ts"].values.astype("datetime64[D]"), index=adm.index, name="date")
+daily_admissions = adm.groupby(admit_day).size()
+
+# KPIs come from the frame already in memory (los_hours is computed in SQL)
+avg_los = float(adm["los_hours"].mean())
+admissions_per_day = float(daily_admissions.mean())
+by_unit = adm.groupby("unit_id", observed=True)["los_hours"].mean().reset_index()
 
 # Proxy occupancy (quick)
 daily_arrivals = (
-    adm.assign(date=adm["admit_ts"].dt.date)
-    .groupby(["hospital","unit_id","date"])
+    adm.assign(date=admit_day)
+    .groupby(["hospital","unit_id","date"], observed=True)
     .size()
     .reset_index(name="arrivals")
 )
@@ -209,7 +246,8 @@ occ_proxy["occ_proxy"] = (occ_proxy["arrivals"] / occ_proxy["baseline_staffed_be
 avg_occ_proxy_pct = float(occ_proxy["occ_proxy"].mean() * 100) if len(occ_proxy) else 0.0
 
 # TRUE daily census occupancy
-true_occ = compute_daily_true_occupancy(adm, beds_ref, date_range[0], date_range[1])
+census = load_daily_census(db_mtime, date_range[0], date_range[1], hospital=hospital, unit=unit)
+true_occ = compute_daily_true_occupancy(census, beds_ref)
 avg_true_occ_pct = float(true_occ["occ_pct"].mean()) if len(true_occ) else 0.0
 
 k1, k2, k3, k4 = st.columns(4)
@@ -225,13 +263,12 @@ st.divider()
 
 # ---------- Charts ----------
 # Admissions over time
-ts = adm.groupby(adm["admit_ts"].dt.date).size().reset_index(name="admissions")
-fig1 = px.line(ts, x="admit_ts", y="admissions", title="Admissions Over Time")
-fig1.update_layout(xaxis_title="Date", yaxis_title="Number of admissions")
+# Time series use prebuilt WebGL traces (no Plotly Express frame inspection)
+fig1 = go.Figure(go.Scattergl(x=daily_admissions.index.values, y=daily_admissions.values, mode="lines"))
+fig1.update_layout(title="Admissions Over Time", xaxis_title="Date", yaxis_title="Number of admissions")
 st.plotly_chart(fig1, use_container_width=True)
 
 # Average LOS by unit
-by_unit = adm.groupby("unit_id")["los_hours"].mean().reset_index()
 fig2 = px.bar(by_unit, x="unit_id", y="los_hours", title="Average LOS by Unit")
 fig2.update_layout(xaxis_title="Department", yaxis_title="Average LOS (hrs)")
 st.plotly_chart(fig2, use_container_width=True)
@@ -239,7 +276,7 @@ st.plotly_chart(fig2, use_container_width=True)
 # ED wait by triage (if ED present)
 ed = adm.loc[adm["unit_id"].eq("ED")].dropna(subset=["wait_minutes"]).copy()
 if len(ed) > 0:
-    by_triage = ed.groupby("triage_level")["wait_minutes"].mean().reset_index()
+    by_triage = ed.groupby("triage_level", observed=True)["wait_minutes"].mean().reset_index()
     fig3 = px.bar(by_triage, x="triage_level", y="wait_minutes", title="Emergency Department Average Wait (mins) by Triage Level")
     st.plotly_chart(fig3, use_container_width=True)
 
@@ -247,8 +284,10 @@ if len(ed) > 0:
 if not true_occ.empty:
     # Aggregate to a single line (overall) OR show by unit/hospital for detail.
     # Here we plot overall mean TRUE occupancy per day across selected groups:
-    true_daily = true_occ.groupby("date")["occ_pct"].mean().reset_index()
-    fig4 = px.line(true_daily, x="date", y="occ_pct", title="Daily TRUE Occupancy % (Mean across selected units/hospitals)")
+    true_daily = true_occ.groupby("date")["occ_pct"].mean()
+    fig4 = go.Figure(go.Scattergl(x=true_daily.index.values, y=true_daily.values, mode="lines"))
+    fig4.update_layout(title="Daily TRUE Occupancy % (Mean across selected units/hospitals)",
+                       xaxis_title="date", yaxis_title="occ_pct")
     st.plotly_chart(fig4, use_container_width=True)
 
     # Optional: uncomment to show a faceted chart by unit or hospital
@@ -258,12 +297,15 @@ if not true_occ.empty:
 # ---------- Drill-down + export ----------
 st.subheader("Drill-down (filtered encounters)")
 cols = ["encounter_id","patient_id","hospital","unit_id","triage_level","admit_ts","discharge_ts","wait_minutes"]
+# adm is already loaded (in rowid order) for the charts and export; slicing it is free
 st.dataframe(adm[cols].head(1000))
 
+# Deferred: the CSV is only serialized when the button is actually clicked
 st.download_button(
     "Download filtered encounters (CSV)",
-    data=adm.to_csv(index=False),
+    data=lambda: adm.to_csv(index=False).encode("utf-8"),
     file_name="filtered_encounters.csv",
+    mime="text/csv",
 )
 
 # ---------- Caveats ----------
@@ -272,6 +314,7 @@ with st.expander("Data caveats & definitions"):
         """
 - **TRUE Occupancy** computes daily concurrent census (count of active encounters per day) ÷ staffed beds.
   A patient counts on day *D* if `admit_ts.date() <= D` and `discharge_ts.date() > D`.
+  Every selected unit is averaged in each day, so a unit with no patients that day counts as 0%.
 - **Proxy Occupancy** uses arrivals ÷ staffed beds for quick signal only.
 - **LOS (hours)** = `discharge_ts - admit_ts`.
 - **ED wait minutes** reflects triage-to-provider time; for wards, it's transfer lag.
@@ -0,0 +1,39 @@
+# build_db.py -- shared by app_streamlit.py (auto-bootstrap) and make_sqlite.py
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+
+TABLES = ["patients", "units", "bed_capacity", "staff", "admissions"]
+
+
+def build_db(db_path, schema_path, post_load_path, data_dir):
+    """
+    Create the SQLite DB: schema.sql, bulk-load data/<table>.csv for every
+    table in TABLES, then post_load.sql (epoch columns, indexes, daily census,
+    ANALYZE). A failed build removes the partial file.
+    """
+    db_path, data_dir = Path(db_path), Path(data_dir)
+    con = sqlite3.connect(db_path.as_posix())
+    try:
+        con.executescript(Path(schema_path).read_text(encoding="utf-8"))
+
+        # Bulk load: no fsync, in-memory rollback journal, one transaction.
+        # Both PRAGMAs only affect this connection, which is closed below.
+        con.execute("PRAGMA synchronous=OFF")
+        con.execute("PRAGMA journal_mode=MEMORY")
+        con.execute("BEGIN")
+        for name in TABLES:
+            df = pd.read_csv(data_dir / f"{name}.csv")
+            cols = ", ".join(df.columns)
+            marks = ", ".join("?" * len(df.columns))
+            rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+            con.executemany(f"INSERT INTO {name} ({cols}) VALUES ({marks})", rows)
+        con.commit()
+
+        con.executescript(Path(post_load_path).read_text(encoding="utf-8"))
+    except BaseException:
+        con.close()
+        db_path.unlink(missing_ok=True)
+        raise
+    con.close()
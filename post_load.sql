@@ -0,0 +1,47 @@
+-- Derived columns, indexes and summary tables, run once after the CSVs are loaded
+
+-- Integer unix timestamps: cheap range filters and date math downstream
+UPDATE admissions SET
+  admit_epoch = CAST(strftime('%s', admit_ts) AS INTEGER),
+  discharge_epoch = CAST(strftime('%s', discharge_ts) AS INTEGER);
+
+-- Composite/range indexes for the dashboard's filter-aware queries
+CREATE INDEX IF NOT EXISTS idx_adm_hosp_unit_ts ON admissions(hospital, unit_id, admit_epoch);
+CREATE INDEX IF NOT EXISTS idx_adm_ts ON admissions(admit_epoch);
+CREATE INDEX IF NOT EXISTS idx_adm_disc ON admissions(discharge_epoch);
+
+-- Daily census for every (hospital, unit) on every day from first admit to
+-- last discharge; days with nobody in house are stored as 0.
+-- Each stay is a +1 event on its admit day and a -1 event on its discharge
+-- day (the discharge day itself is not counted); the census is the running
+-- sum of those events over the zero-filled days x groups grid, so the cost is
+-- O(admissions + days x groups) rather than re-reading stays for every day.
+WITH RECURSIVE bounds(lo, hi) AS (
+  SELECT MIN(admit_epoch) / 86400, MAX(COALESCE(discharge_epoch, admit_epoch)) / 86400
+  FROM admissions
+),
+days(d) AS (
+  SELECT lo FROM bounds
+  UNION ALL
+  SELECT d + 1 FROM days, bounds WHERE d < hi
+),
+groups AS (SELECT DISTINCT hospital, unit_id FROM admissions),
+events AS (
+  SELECT hospital, unit_id, admit_epoch / 86400 AS d, 1 AS delta FROM admissions
+  UNION ALL
+  SELECT hospital, unit_id, MAX(discharge_epoch, admit_epoch) / 86400, -1 FROM admissions
+  WHERE discharge_epoch IS NOT NULL
+),
+deltas AS (
+  SELECT hospital, unit_id, d, SUM(delta) AS delta FROM events GROUP BY hospital, unit_id, d
+)
+INSERT INTO daily_census (hospital, unit_id, date, census)
+SELECT g.hospital, g.unit_id, date(days.d * 86400, 'unixepoch'),
+       SUM(COALESCE(x.delta, 0)) OVER (PARTITION BY g.hospital, g.unit_id ORDER BY days.d)
+FROM groups g
+CROSS JOIN days
+LEFT JOIN deltas x
+  ON x.hospital = g.hospital AND x.unit_id = g.unit_id AND x.d = days.d;
+
+-- Planner statistics so SQLite actually picks the indexes
+ANALYZE;
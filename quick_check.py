@@ -1,7 +1,8 @@
 # quick_check.py
-import sqlite3, pandas as pd
+import sqlite3
 con = sqlite3.connect("hospital.db")
-for t in ["patients","units","bed_capacity","staff","admissions"]:
-    n = pd.read_sql(f"SELECT COUNT(*) as n FROM {t}", con)["n"][0]
+tables = ["patients","units","bed_capacity","staff","admissions","daily_census"]
+q = " UNION ALL ".join(f"SELECT '{t}', COUNT(*) FROM {t}" for t in tables)
+for t, n in con.execute(q).fetchall():
     print(t, n)
 con.close()
@@ -38,5 +38,18 @@ CREATE TABLE IF NOT EXISTS admissions (
   triage_level INTEGER,
   admit_ts TEXT,
   wait_minutes REAL,
-  discharge_ts TEXT
+  discharge_ts TEXT,
+  -- unix seconds derived from admit_ts/discharge_ts at load time
+  admit_epoch INTEGER,
+  discharge_epoch INTEGER
+);
+
+-- Daily concurrent census per (hospital, unit), precomputed at load time.
+-- A patient counts on day D if admit date <= D and discharge date > D.
+CREATE TABLE IF NOT EXISTS daily_census (
+  hospital TEXT,
+  unit_id TEXT,
+  date TEXT,
+  census INTEGER,
+  PRIMARY KEY (hospital, unit_id, date)
 );